@@ -6,23 +6,32 @@ if not os.getenv('DISPLAY'):
     os.environ['DISPLAY'] = ':1'
 
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import json
 from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, ElementNotInteractableException, NoAlertPresentException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, ElementNotInteractableException, JavascriptException, InvalidSessionIdException, NoSuchWindowException
 import re
 import time
+import io
+import base64
+import uuid
 import subprocess
+import socket
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
 import traceback
 
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+import orjson
 import psutil
 import requests
 import pyautogui
@@ -34,13 +43,72 @@ BUNNY_STORAGE_ZONE = os.getenv('BUNNY_STORAGE_ZONE')
 BUNNY_STORAGE_URL = f'https://{os.getenv("BUNNY_REGION")}.storage.bunnycdn.com'
 RECORDING_PROCESS = None
 RECORDING_START_TIME = None
-
-def get_console_logging_script():
-    return """
+DOCUMENTS_DIR = '/home/fume/Documents'
+MAX_DOM_SIZE = 1000000  # 1MB limit for DOM content returned to clients
+
+# Patterns used by extract_body_content
+BODY_RE = re.compile(r'<body\b[^>]*>(.*)</body\s*>', re.DOTALL | re.IGNORECASE)
+BODY_TAG_RE = re.compile(r'<body\b', re.IGNORECASE)
+BODY_CLOSE_RE = re.compile(r'</body\s*>', re.IGNORECASE)
+# Parses extract_body_content's input as UTF-8 whatever encoding the page declares
+UTF8_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+# Comments, scripts and styles, whose text may contain markup that is not part of the page
+HIDDEN_MARKUP_RE = re.compile(r'<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+SCRIPT_RE = re.compile(r'<script\b[^>]*>.*?</script\s*>', re.DOTALL | re.IGNORECASE)
+
+# URL scheme (RFC 3986) used to detect URLs that are missing a protocol
+URL_SCHEME_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+\-.]*://')
+
+# WebDriver sessions attached to each debugging port, reused across requests
+DRIVER_CACHE = {}
+# One lock per port so a slow connect on one port does not block the others
+DRIVER_LOCKS = {}
+DRIVER_LOCK = threading.Lock()
+# Keep-alive connections each WebDriver may hold open to chromedriver (Selenium's default is 1)
+DRIVER_POOL_SIZE = 8
+
+# Page load timeout of a fresh WebDriver session, restored after requests that change it
+DEFAULT_PAGE_LOAD_TIMEOUT = 300
+
+# Where Chrome is usually installed; the first existing one is resolved once at import
+CHROME_LOCATIONS = [
+    r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+    r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    '/usr/bin/google-chrome',
+    '/usr/bin/google-chrome-stable'
+]
+DEFAULT_CHROME_PATH = next((location for location in CHROME_LOCATIONS if os.path.exists(location)), None)
+
+# Worker threads for screen captures that run alongside WebDriver calls
+CAPTURE_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+# Shared HTTP session so probes of the DevTools JSON endpoints reuse connections
+CHROME_SESSION = requests.Session()
+CHROME_SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+def compact_script(source):
+    """Drop indentation, blank lines and whole-line // comments from a JS source, keeping line breaks"""
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+# Records console output and uncaught errors in window._consoleLogs; safe to run more than once
+CONSOLE_LOGGING_SCRIPT = compact_script("""
         // Only initialize if not already initialized
         if (!window._consoleLogs) {
-            // Initialize our log storage
-            window._consoleLogs = [];
+            // Initialize our log storage, picking up what the previous page of this tab recorded
+            try {
+                window._consoleLogs = JSON.parse(sessionStorage.getItem('_consoleLogs') || '[]');
+            } catch (e) {
+                window._consoleLogs = [];
+            }
+
+            // Save the logs when leaving the page so they survive navigation without a round trip
+            window.addEventListener('pagehide', function() {
+                try {
+                    sessionStorage.setItem('_consoleLogs', JSON.stringify(window._consoleLogs.slice(-1000)));
+                } catch (e) {}
+            });
             
             // Store original console methods
             const originalConsole = {
@@ -160,33 +228,77 @@ def get_console_logging_script():
 
             console.log('Console logging system initialized');
         }
-    """
+""")
 
 def extract_body_content(dom_string):
-    # Parse the DOM string
-    soup = BeautifulSoup(dom_string, 'html.parser')
-    
+    if not dom_string:
+        return "No body tag found in the DOM string."
+
+    # Count the body tags outside comments, scripts and styles; lxml adds a <body> to any
+    # fragment, so only go on when the source really has one
+    body_tags = len(BODY_TAG_RE.findall(HIDDEN_MARKUP_RE.sub('', dom_string)))
+    if not body_tags:
+        return "No body tag found in the DOM string."
+
+    # Fast path: slice the body out of serialized HTML without building a tree. Only safe when
+    # the real body tags are the only body-like text in the page, otherwise the regex could
+    # match one inside a script or comment.
+    if (body_tags == 1 and len(BODY_TAG_RE.findall(dom_string)) == 1
+            and len(BODY_CLOSE_RE.findall(dom_string)) == 1):
+        match = BODY_RE.search(dom_string)
+        if match:
+            return "<body>\n" + SCRIPT_RE.sub('', match.group(1)) + "\n</body>"
+
+    # Parse the DOM string with the C-backed lxml parser. lxml rejects str input that starts with
+    # an <?xml encoding=...?> declaration, so parse UTF-8 bytes with the encoding pinned instead.
+    try:
+        root = lxml_html.document_fromstring(dom_string.encode('utf-8'), parser=UTF8_HTML_PARSER)
+    except etree.ParserError:
+        # Nothing but whitespace or comments
+        return "No body tag found in the DOM string."
+
     # Find the body tag
-    body = soup.body
-    
-    if body:
-        # Remove all script tags
-        for script in body(["script"]):
-            script.decompose()
-        
-        # Get the HTML content
-        content = ''.join(str(child) for child in body.children)
-        
+    body = root.find('body')
+
+    if body is not None:
+        # Remove all script tags (drop_tree keeps the text that follows each one)
+        for script in list(body.iter('script')):
+            script.drop_tree()
+
+        # Serialize the body once and strip its own tags to get the inner HTML
+        body.attrib.clear()
+        content = lxml_html.tostring(body, encoding='unicode', with_tail=False)
+        content = content[len('<body>'):-len('</body>')]
+
         return "<body>\n" + content + "\n</body>"
     else:
         return "No body tag found in the DOM string."
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, which encodes the large screenshot/DOM payloads much faster"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Compress JSON responses (DOM dumps shrink several-fold) for clients that accept it;
+# Brotli at a low level keeps the encode cheap next to the transfer it saves
+app.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_BR_LEVEL=4,
+    COMPRESS_MIN_SIZE=4096
+)
+Compress(app)
 
 def get_chrome_info(port):
     try:
         # Get the list of pages
-        response = requests.get(f'http://localhost:{port}/json')
+        response = CHROME_SESSION.get(f'http://localhost:{port}/json', timeout=1)
         if response.status_code == 200:
             pages = response.json()
             if pages:
@@ -197,28 +309,10 @@ def get_chrome_info(port):
                     "url": page.get('url', 'N/A'),
                     "title": page.get('title', 'N/A')
                 }
-    except requests.exceptions.ConnectionError:
+    except requests.exceptions.RequestException:
         pass
     return {"running": False}
 
-def dismiss_alerts(driver, timeout=1):
-    """
-    Dismiss any alerts present on the page.
-    :param driver: Selenium WebDriver instance
-    :param timeout: Maximum time to wait for an alert (default 1 second)
-    :return: True if an alert was dismissed, False otherwise
-    """
-    try:
-        # Wait for an alert to be present
-        WebDriverWait(driver, timeout).until(EC.alert_is_present())
-        # Switch to the alert and dismiss it
-        alert = driver.switch_to.alert
-        alert.dismiss()
-        return True
-    except (TimeoutException, NoAlertPresentException):
-        # No alert found within the timeout period or no alert present
-        return False
-
 def handle_alerts(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -226,42 +320,97 @@ def handle_alerts(func):
         for attempt in range(max_attempts):
             try:
                 debugging_port = kwargs.get('debugging_port', 9222)
+                # The session dismisses alerts itself (see connect_to_chrome), so no polling here
                 driver = connect_to_chrome(debugging_port)
-                
-                # Dismiss any initial alerts
-                dismiss_alerts(driver, timeout=2)
 
                 # Call the original function
-                result = func(driver, *args, **kwargs)
-
-                # Dismiss any alerts that may have appeared during function execution
-                dismiss_alerts(driver, timeout=2)
-
-                return result
-            except Exception as e:
+                return func(driver, *args, **kwargs)
+            # Only session and connection failures are worth a reconnect; element and script
+            # errors come from the page and are raised at once
+            except (InvalidSessionIdException, NoSuchWindowException, urllib3.exceptions.HTTPError, ConnectionError) as e:
                 if attempt == max_attempts - 1:
                     raise
                 print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
+                # Reconnect on the next attempt in case the cached session is broken
+                drop_cached_driver(debugging_port)
                 time.sleep(1)
     return wrapper
 
+def validate(**spec):
+    """
+    Parse the JSON body (the query string for GET) once and pass the declared fields to the view
+    as keyword arguments. Fields are declared as name=(type or tuple of types, default); a field
+    sent with the wrong type is rejected with a 400. debugging_port is also converted to an int
+    and must be a valid TCP port. Apply it above @handle_alerts so the driver is opened on the
+    requested debugging_port.
+    """
+    # Build the field checks once, when the view is decorated
+    fields = []
+    for name, (types, default) in spec.items():
+        types = types if isinstance(types, tuple) else (types,)
+        type_names = ' or '.join(t.__name__ for t in types)
+        # bool is a subclass of int, so only accept true/false where bool is declared
+        allow_bool = bool in types
+        fields.append((name, types, type_names, allow_bool, default))
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                if request.method == 'GET':
+                    data = request.args.to_dict()
+                else:
+                    data = orjson.loads(request.get_data(cache=False) or b'{}')
+            except orjson.JSONDecodeError:
+                return jsonify({"error": "Request body must be valid JSON"}), 400
+            if not isinstance(data, dict):
+                return jsonify({"error": "Request body must be a JSON object"}), 400
+
+            for name, types, type_names, allow_bool, default in fields:
+                value = data.get(name)
+                if value is None:
+                    kwargs[name] = default
+                elif isinstance(value, types) and (allow_bool or not isinstance(value, bool)):
+                    kwargs[name] = value
+                else:
+                    return jsonify({"error": f"'{name}' must be of type {type_names}"}), 400
+
+            # Ports may be sent as strings, so convert them here rather than failing later with a 500
+            if 'debugging_port' in kwargs:
+                try:
+                    port = int(kwargs['debugging_port'])
+                except ValueError:
+                    port = None
+                if port is None or not 0 < port < 65536:
+                    return jsonify({"error": "'debugging_port' must be a port number between 1 and 65535"}), 400
+                kwargs['debugging_port'] = port
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 def kill_chrome_processes():
     """Helper function to kill all Chrome-related processes"""
     chrome_names = ['chrome', 'chromium', 'chromedriver']
-    
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+    killed = []
+
+    for proc in psutil.process_iter(['name']):
         try:
-            # Check process name and cmdline
+            # Check the process name first; only read the cmdline when the name doesn't match
             proc_name = proc.info['name'].lower() if proc.info['name'] else ''
-            proc_cmdline = ' '.join(proc.info['cmdline']).lower() if proc.info['cmdline'] else ''
-            
+            if not any(chrome_name in proc_name for chrome_name in chrome_names):
+                proc_cmdline = ' '.join(proc.cmdline()).lower()
+                if not any(chrome_name in proc_cmdline for chrome_name in chrome_names):
+                    continue
+
             # Kill if process matches any chrome-related names
-            if any(chrome_name in proc_name or chrome_name in proc_cmdline 
-                  for chrome_name in chrome_names):
-                proc.kill()
+            proc.kill()
+            killed.append(proc)
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             continue
 
+    # Return as soon as the killed processes have actually exited
+    psutil.wait_procs(killed, timeout=3)
+
 def clear_chrome_session(user_profile):
     """Clear Chrome session data without deleting the entire profile"""
     profile_dir = f'chrome-data/{user_profile}/Default'
@@ -321,12 +470,25 @@ def clear_chrome_session(user_profile):
 
 def is_chrome_running(port):
     """Check if Chrome is running on the specified debugging port"""
+    # A bare TCP connect is enough to tell whether the DevTools server is listening
     try:
-        response = requests.get(f'http://localhost:{port}/json/version', timeout=1)
-        return response.status_code == 200
-    except requests.exceptions.RequestException:
+        with socket.create_connection(('localhost', int(port)), timeout=0.2):
+            return True
+    except OSError:
         return False
 
+def wait_for_chrome(port, timeout=5, interval=0.05, running=True):
+    """
+    Poll the debugging port until Chrome is listening (or, with running=False, has stopped),
+    returning whether that happened in time
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_chrome_running(port) == running:
+            return True
+        time.sleep(interval)
+    return False
+
 def close_chrome_gracefully(debugging_port=9222):
     """Attempt to close Chrome gracefully before forcing kill"""
     # First check if Chrome is running to avoid timeout
@@ -336,9 +498,7 @@ def close_chrome_gracefully(debugging_port=9222):
         
     try:
         # Try to connect to existing Chrome instance
-        chrome_options = Options()
-        chrome_options.add_experimental_option("debuggerAddress", f"localhost:{debugging_port}")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = connect_to_chrome(debugging_port)
         
         # Close all windows/tabs
         for handle in driver.window_handles:
@@ -346,8 +506,8 @@ def close_chrome_gracefully(debugging_port=9222):
             driver.close()
             
         # Quit the browser
-        driver.quit()
-        time.sleep(1)  # Give it a moment to close
+        drop_cached_driver(debugging_port)
+        wait_for_chrome(debugging_port, timeout=1, running=False)  # Give it a moment to close
         
         return True
     except Exception as e:
@@ -355,10 +515,9 @@ def close_chrome_gracefully(debugging_port=9222):
         return False
 
 @app.route('/start_browser', methods=['POST'])
-def start_browser():
-    data = request.json
-    debugging_port = data.get('debugging_port', 9222)
-    refresh_enabled = data.get('refresh_enabled', False)
+@validate(debugging_port=((int, str), 9222), refresh_enabled=(bool, False), chrome_path=(str, ''),
+          display=(str, ':1'), user_profile=(str, 'Default'))
+def start_browser(debugging_port, refresh_enabled, chrome_path, display, user_profile):
 
     try:
         if refresh_enabled:
@@ -366,38 +525,28 @@ def start_browser():
             if not close_chrome_gracefully(debugging_port):
                 # Fall back to force kill if graceful close fails
                 kill_chrome_processes()
+                # Every chromedriver was killed, so no cached driver on any port is usable
+                clear_driver_cache()
 
-            time.sleep(1)  # Wait for processes to terminate
-        
-        chrome_path = data.get('chrome_path', '')
-        display = data.get('display', ':1')
-        user_profile = data.get('user_profile', 'Default')
+            wait_for_chrome(debugging_port, timeout=1, running=False)  # Wait for processes to terminate
         
         # Clear session data before starting new browser
         clear_chrome_session(user_profile)
 
         if not chrome_path:
-            common_locations = [
-                r'C:\Program Files\Google\Chrome\Application\chrome.exe',
-                r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
-                '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
-                '/usr/bin/google-chrome',
-                '/usr/bin/google-chrome-stable'
-            ]
-            for location in common_locations:
-                if os.path.exists(location):
-                    chrome_path = location
-                    break
+            chrome_path = DEFAULT_CHROME_PATH
 
         if not chrome_path:
             return jsonify({"error": "Chrome executable not found. Please provide the path."}), 400
 
         try:
-            os.environ['DISPLAY'] = display
-            
-            # Add these environment variables
-            os.environ['DBUS_SESSION_BUS_ADDRESS'] = '/dev/null'
-            os.environ['CHROME_DBUS_DISABLE'] = '1'
+            # Chrome's environment; the server's own os.environ is left untouched
+            chrome_env = {
+                **os.environ,
+                'DISPLAY': display,
+                'DBUS_SESSION_BUS_ADDRESS': '/dev/null',
+                'CHROME_DBUS_DISABLE': '1'
+            }
             
             chrome_command = [
                 chrome_path,
@@ -597,16 +746,20 @@ def start_browser():
             with open(prefs_file, 'w') as f:
                 json.dump(prefs, f)
 
-            subprocess.Popen(chrome_command, env=os.environ)
+            # Detach Chrome from our stdio so its chatty output can't fill a pipe and stall it
+            subprocess.Popen(chrome_command, env=chrome_env, close_fds=True, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, start_new_session=True)
 
-            # Wait for Chrome to start
-            time.sleep(2)
+            # Wait for Chrome's DevTools endpoint to come up
+            if not wait_for_chrome(debugging_port):
+                print(f"Warning: Chrome did not respond on port {debugging_port} in time")
             
             # Connect to Chrome and inject the scripts
             try:
                 driver = connect_to_chrome(debugging_port)
                 driver.execute_script(remove_automation_flags_script)
-                driver.execute_script(get_console_logging_script())
+                # Later documents get the logger from connect_to_chrome; this covers the page already open
+                driver.execute_script(CONSOLE_LOGGING_SCRIPT)
             except Exception as e:
                 print(f"Warning: Failed to inject scripts: {str(e)}")
 
@@ -630,19 +783,88 @@ def start_browser():
         print(f"Warning during Chrome cleanup: {str(e)}")
 
 def connect_to_chrome(debugging_port=9222):
-    chrome_options = Options()
-    chrome_options.add_experimental_option("debuggerAddress", f"localhost:{debugging_port}")
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    """Return the cached WebDriver for the debugging port, reconnecting if its session went stale"""
+    debugging_port = int(debugging_port)
+    with get_driver_lock(debugging_port):
+        driver = DRIVER_CACHE.get(debugging_port)
+        if driver is not None:
+            try:
+                # Cheap liveness probe
+                driver.current_window_handle
+                return driver
+            except (WebDriverException, urllib3.exceptions.HTTPError):
+                # A dead session or a dead chromedriver
+                quit_driver(driver)
+
+        chrome_options = Options()
+        chrome_options.add_experimental_option("debuggerAddress", f"localhost:{debugging_port}")
+        # chromedriver dismisses any open alert before running a command, at no extra round trip
+        chrome_options.unhandled_prompt_behavior = 'dismiss'
+        driver = webdriver.Chrome(options=chrome_options)
+        # Let concurrent commands on the shared driver reuse connections instead of discarding them
+        # (built by Selenium so its proxy and CA settings are kept, with only the pool size raised)
+        executor = driver.command_executor
+        connection_manager = executor._get_connection_manager()
+        connection_manager.connection_pool_kw['maxsize'] = DRIVER_POOL_SIZE
+        if getattr(executor, '_conn', None) is not None:
+            executor._conn.clear()
+        executor._conn = connection_manager
+
+        register_console_logging(driver)
+        DRIVER_CACHE[debugging_port] = driver
+        return driver
+
+def register_console_logging(driver):
+    """
+    Have Chrome run the console logger in every new document of the driver's current window,
+    so requests don't inject it. chromedriver sends CDP commands to the current window only,
+    so each window handle is registered once, after switching to it.
+    """
+    if not hasattr(driver, 'console_logging_handles'):
+        driver.console_logging_handles = set()
+    handle = driver.current_window_handle
+    if handle in driver.console_logging_handles:
+        return
+    try:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': CONSOLE_LOGGING_SCRIPT})
+        driver.console_logging_handles.add(handle)
+    except WebDriverException as e:
+        print(f"Warning: Could not register console logging: {str(e)}")
+
+def get_driver_lock(debugging_port):
+    """Return the lock guarding the cached WebDriver for the debugging port"""
+    with DRIVER_LOCK:
+        return DRIVER_LOCKS.setdefault(debugging_port, threading.Lock())
+
+def drop_cached_driver(debugging_port=9222):
+    """Forget the cached WebDriver for the debugging port so the next request reconnects"""
+    debugging_port = int(debugging_port)
+    with get_driver_lock(debugging_port):
+        driver = DRIVER_CACHE.pop(debugging_port, None)
+    if driver is not None:
+        quit_driver(driver)
+
+def clear_driver_cache():
+    """Forget the cached WebDriver of every port"""
+    with DRIVER_LOCK:
+        ports = list(DRIVER_CACHE)
+    for debugging_port in ports:
+        drop_cached_driver(debugging_port)
+
+def quit_driver(driver):
+    """Stop the chromedriver behind a WebDriver, ignoring errors from dead sessions"""
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"Warning: Could not quit driver: {str(e)}")
 
 def establish_stable_connection(debugging_port=9222, max_retries=3):
     """Establish a stable connection to Chrome with retries"""
     for attempt in range(max_retries):
         try:
-            chrome_options = Options()
-            chrome_options.add_experimental_option("debuggerAddress", f"localhost:{debugging_port}")
-            driver = webdriver.Chrome(options=chrome_options)
-            
+            drop_cached_driver(debugging_port)
+            driver = connect_to_chrome(debugging_port)
+
             # Test the connection by executing a simple command
             driver.execute_script("return document.readyState")
             return driver
@@ -653,18 +875,83 @@ def establish_stable_connection(debugging_port=9222, max_retries=3):
             
     raise Exception("Failed to establish stable connection")
 
+# Resolves once the DOM has been parsed, or once the page has fully loaded if arguments[0] is true
+PAGE_READY_SCRIPT = """
+    const done = arguments[arguments.length - 1];
+    const fullLoad = arguments[0];
+    const ready = fullLoad ? document.readyState === 'complete' : document.readyState !== 'loading';
+    if (ready) {
+        done(true);
+    } else {
+        window.addEventListener(fullLoad ? 'load' : 'DOMContentLoaded', () => done(true), {once: true});
+    }
+"""
+
+def wait_for_page(driver, timeout, full_load=False):
+    """
+    Wait until the page's DOM is parsed (or fully loaded with full_load=True) using a single
+    event-driven script instead of polling. Raises TimeoutException after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutException(f"Page did not load within {timeout} seconds")
+        driver.set_script_timeout(remaining)
+        try:
+            driver.execute_async_script(PAGE_READY_SCRIPT, full_load)
+            return
+        except JavascriptException:
+            # The document was replaced while waiting (navigation in progress), wait on the new one
+            time.sleep(0.05)
+
+# Describes the element under (x, y); arguments are x, y and the screenshot's top crop,
+# which is subtracted from y so the lookup matches the screenshot
+ELEMENT_AT_POINT_SCRIPT = compact_script("""
+    const element = document.elementFromPoint(arguments[0], arguments[1] - arguments[2]);
+    if (!element) return null;
+    const rect = element.getBoundingClientRect();
+    return {
+        html: element.outerHTML,
+        id: element.id,
+        tagName: element.tagName,
+        className: element.className,
+        offset: {top: rect.top, left: rect.left}
+    };
+""")
+
+# Scrolls the element into view and returns its center in viewport coordinates
+ELEMENT_CENTER_SCRIPT = compact_script("""
+    arguments[0].scrollIntoView({block: 'center', inline: 'center'});
+    const rect = arguments[0].getBoundingClientRect();
+    return {x: rect.left + rect.width / 2, y: rect.top + rect.height / 2};
+""")
+
+def dispatch_mouse_event(driver, event_type, point, **params):
+    """Send a left-button mouse event at a viewport point ({'x', 'y'}) through CDP"""
+    driver.execute_cdp_cmd('Input.dispatchMouseEvent', {
+        'type': event_type,
+        'x': point['x'],
+        'y': point['y'],
+        'button': 'left',
+        **params
+    })
+
+def click_at(driver, point, click_count=1):
+    """Click a viewport point with CDP mouse events; click_count=2 makes it a double click"""
+    dispatch_mouse_event(driver, 'mouseMoved', point)
+    for count in range(1, click_count + 1):
+        dispatch_mouse_event(driver, 'mousePressed', point, clickCount=count)
+        dispatch_mouse_event(driver, 'mouseReleased', point, clickCount=count)
+
 @app.route('/click_element', methods=['POST'])
+@validate(xpath=(str, None), x=((int, float), None), y=((int, float), None),
+          debugging_port=((int, str), 9222), wait_time=((int, float), 10))
 @handle_alerts
-def click_element(driver):
-    data = request.json
-    xpath = data.get('xpath')
-    x_coord = data.get('x')
-    y_coord = data.get('y')
-    debugging_port = data.get('debugging_port', 9222)
-    wait_time = data.get('wait_time', 10)
+def click_element(driver, xpath, x, y, debugging_port, wait_time):
     SCREENSHOT_TOP_CROP = 50  # Define constant for element detection only
 
-    if not xpath and (x_coord is None or y_coord is None):
+    if not xpath and (x is None or y is None):
         return jsonify({"error": "Either XPath or both X and Y coordinates must be provided"}), 400
 
     max_retries = 3
@@ -681,33 +968,13 @@ def click_element(driver):
             pyautogui.FAILSAFE = True
 
             if xpath:
-                # XPath-based clicking logic
-                element = WebDriverWait(driver, wait_time).until(
-                    EC.presence_of_element_located((By.XPATH, xpath))
-                )
-                
+                # XPath-based clicking logic (clickable implies present)
                 element = WebDriverWait(driver, wait_time).until(
                     EC.element_to_be_clickable((By.XPATH, xpath))
                 )
-                
-                # Get element's position relative to viewport
-                element_rect = element.rect
-                
-                # Calculate center point of the element
-                center_x = element_rect['x'] + (element_rect['width'] / 2)
-                center_y = element_rect['y'] + (element_rect['height'] / 2)
-                
-                # Get the window position
-                window_rect = driver.get_window_rect()
-                
-                # Calculate absolute screen coordinates (no offset for clicking)
-                abs_x = window_rect['x'] + center_x
-                abs_y = window_rect['y'] + center_y
-                
-                # Move mouse and perform click with retry
-                pyautogui.moveTo(abs_x, abs_y, duration=0.2)
-                time.sleep(0.1)
-                pyautogui.click()
+
+                # Click the element's center in viewport coordinates, so browser UI and scrolling don't shift it
+                click_at(driver, driver.execute_script(ELEMENT_CENTER_SCRIPT, element))
                 
                 result = "Click performed at element location"
                 
@@ -716,40 +983,18 @@ def click_element(driver):
                 window_rect = driver.get_window_rect()
                 
                 # Calculate absolute screen coordinates (no offset for clicking)
-                abs_x = window_rect['x'] + x_coord
-                abs_y = window_rect['y'] + y_coord
+                abs_x = window_rect['x'] + x
+                abs_y = window_rect['y'] + y
                 
                 # Get element info before clicking (adjust Y for element detection)
-                element_info = driver.execute_script("""
-                    function getElementFromPoint(x, y) {
-                        // Adjust y-coordinate for element detection to match screenshot
-                        const adjustedY = y - arguments[2];  // Subtract crop offset
-                        const element = document.elementFromPoint(x, adjustedY);
-                        if (element) {
-                            return {
-                                html: element.outerHTML,
-                                id: element.id,
-                                tagName: element.tagName,
-                                className: element.className,
-                                offset: {
-                                    top: element.getBoundingClientRect().top,
-                                    left: element.getBoundingClientRect().left
-                                }
-                            };
-                        }
-                        return null;
-                    }
-                    return getElementFromPoint(arguments[0], arguments[1], arguments[2]);
-                """, x_coord, y_coord, SCREENSHOT_TOP_CROP)
+                element_info = driver.execute_script(ELEMENT_AT_POINT_SCRIPT, x, y, SCREENSHOT_TOP_CROP)
                 
-                # Move mouse and perform click with retry
-                pyautogui.moveTo(abs_x, abs_y, duration=0.2)
-                time.sleep(0.1)
-                pyautogui.click()
+                # Move the mouse and click in one gesture
+                pyautogui.click(abs_x, abs_y, duration=0.2)
                 
                 result = {
                     "message": "Click performed at coordinates",
-                    "intended_coordinates": {"x": x_coord, "y": y_coord},
+                    "intended_coordinates": {"x": x, "y": y},
                     "actual_coordinates": {"x": abs_x, "y": abs_y},
                     "clicked_element": element_info
                 }
@@ -765,17 +1010,13 @@ def click_element(driver):
     return jsonify({"error": "All retry attempts failed"}), 500
 
 @app.route('/double_click_element', methods=['POST'])
+@validate(xpath=(str, None), x=((int, float), None), y=((int, float), None),
+          debugging_port=((int, str), 9222), wait_time=((int, float), 10))
 @handle_alerts
-def double_click_element(driver):
-    data = request.json
-    xpath = data.get('xpath')
-    x_coord = data.get('x')
-    y_coord = data.get('y')
-    debugging_port = data.get('debugging_port', 9222)
-    wait_time = data.get('wait_time', 10)
+def double_click_element(driver, xpath, x, y, debugging_port, wait_time):
     SCREENSHOT_TOP_CROP = 50  # Define constant for element detection only
 
-    if not xpath and (x_coord is None or y_coord is None):
+    if not xpath and (x is None or y is None):
         return jsonify({"error": "Either XPath or both X and Y coordinates must be provided"}), 400
 
     try:
@@ -789,17 +1030,8 @@ def double_click_element(driver):
                 EC.presence_of_element_located((By.XPATH, xpath))
             )
             
-            # Get element's location and browser window position
-            element_location = element.location
-            window_rect = driver.get_window_rect()
-            
-            # Calculate absolute screen coordinates (no offset for clicking)
-            abs_x = window_rect['x'] + element_location['x']
-            abs_y = window_rect['y'] + element_location['y']
-            
-            # Move mouse and double click
-            pyautogui.moveTo(abs_x, abs_y)
-            pyautogui.doubleClick()
+            # Double click the element's center in viewport coordinates
+            click_at(driver, driver.execute_script(ELEMENT_CENTER_SCRIPT, element), click_count=2)
             
             result = "Double click performed at element location"
             
@@ -808,39 +1040,18 @@ def double_click_element(driver):
             window_rect = driver.get_window_rect()
             
             # Calculate absolute screen coordinates (no offset for clicking)
-            abs_x = window_rect['x'] + x_coord
-            abs_y = window_rect['y'] + y_coord
+            abs_x = window_rect['x'] + x
+            abs_y = window_rect['y'] + y
             
             # Get element info before clicking (adjust Y for element detection)
-            element_info = driver.execute_script("""
-                function getElementFromPoint(x, y) {
-                    // Adjust y-coordinate for element detection to match screenshot
-                    const adjustedY = y - arguments[2];  // Subtract crop offset
-                    const element = document.elementFromPoint(x, adjustedY);
-                    if (element) {
-                        return {
-                            html: element.outerHTML,
-                            id: element.id,
-                            tagName: element.tagName,
-                            className: element.className,
-                            offset: {
-                                top: element.getBoundingClientRect().top,
-                                left: element.getBoundingClientRect().left
-                            }
-                        };
-                    }
-                    return null;
-                }
-                return getElementFromPoint(arguments[0], arguments[1], arguments[2]);
-            """, x_coord, y_coord, SCREENSHOT_TOP_CROP)
+            element_info = driver.execute_script(ELEMENT_AT_POINT_SCRIPT, x, y, SCREENSHOT_TOP_CROP)
             
-            # Move mouse and double click
-            pyautogui.moveTo(abs_x, abs_y)
-            pyautogui.doubleClick()
+            # Move mouse and double click in one gesture
+            pyautogui.doubleClick(abs_x, abs_y)
             
             result = {
                 "message": "Double click performed at coordinates",
-                "intended_coordinates": {"x": x_coord, "y": y_coord},
+                "intended_coordinates": {"x": x, "y": y},
                 "actual_coordinates": {"x": abs_x, "y": abs_y},
                 "clicked_element": element_info
             }
@@ -868,19 +1079,15 @@ def get_browser_content_offset(driver):
     """)
     
 @app.route('/go_to_url', methods=['POST'])
+@validate(url=(str, None), debugging_port=((int, str), 9222), timeout=((int, float), 300), page_load_timeout=((int, float), 300))
 @handle_alerts
-def go_to_url(driver):
-    data = request.json
-    url = data.get('url')
-    debugging_port = data.get('debugging_port', 9222)
-    timeout = data.get('timeout', 300)
-    page_load_timeout = data.get('page_load_timeout', 300)
+def go_to_url(driver, url, debugging_port, timeout, page_load_timeout):
 
     if not url:
         return jsonify({"error": "URL not provided"}), 400
 
     # Handle missing protocol
-    if not re.match(r'^\w+://', url):
+    if not URL_SCHEME_RE.match(url):
         url = f'https://{url}'
 
     try:
@@ -890,7 +1097,7 @@ def go_to_url(driver):
         print(f"Attempting to navigate to: {url}")
         
         # Get all tabs information
-        response = requests.get(f'http://localhost:{debugging_port}/json')
+        response = CHROME_SESSION.get(f'http://localhost:{debugging_port}/json', timeout=5)
         if response.status_code != 200:
             return jsonify({"error": "Failed to get tabs information"}), 500
             
@@ -913,13 +1120,12 @@ def go_to_url(driver):
         if not active_tab:
             return jsonify({"error": "Could not find active tab"}), 500
 
-        # Create a new driver instance connected to the active tab
-        chrome_options = Options()
-        chrome_options.add_experimental_option("debuggerAddress", f"localhost:{debugging_port}")
-        active_driver = webdriver.Chrome(options=chrome_options)
+        # Point the cached driver for this port at the active tab
+        active_driver = connect_to_chrome(debugging_port)
         active_driver.switch_to.window(active_tab['id'])
+        register_console_logging(active_driver)
         
-        # Set page load timeout
+        # Set page load timeout; the driver is shared, so it is reset once navigation is done
         active_driver.set_page_load_timeout(page_load_timeout)
         
         try:
@@ -927,9 +1133,7 @@ def go_to_url(driver):
             active_driver.execute_script(f"window.location.href = '{url}';")
             
             # Wait for page load with timeout
-            WebDriverWait(active_driver, timeout).until(
-                lambda d: d.execute_script('return document.readyState') == 'complete'
-            )
+            wait_for_page(active_driver, timeout, full_load=True)
         except TimeoutException:
             elapsed_time = time.time() - start_time
             return jsonify({
@@ -938,6 +1142,8 @@ def go_to_url(driver):
                 "partial_title": active_driver.title,
                 "status": "timeout"
             }), 504
+        finally:
+            active_driver.set_page_load_timeout(DEFAULT_PAGE_LOAD_TIMEOUT)
 
         current_url = active_driver.current_url
         page_title = active_driver.title
@@ -945,9 +1151,6 @@ def go_to_url(driver):
         print(f"Current URL: {current_url}")
         print(f"Page title: {page_title}")
 
-        # Clean up the active driver
-        active_driver.quit()
-
         return jsonify({
             "message": "Navigation completed successfully",
             "current_url": current_url,
@@ -967,16 +1170,22 @@ def go_to_url(driver):
             "status": "error"
         }), 500
     
+# Key events that clear the focused field through CDP, the same channel Input.insertText uses;
+# the editing commands make select-all and delete work regardless of the platform's shortcuts
+SELECT_ALL_KEY = {'key': 'a', 'code': 'KeyA', 'windowsVirtualKeyCode': 65, 'nativeVirtualKeyCode': 65,
+                  'modifiers': 4 if platform.system() == 'Darwin' else 2, 'commands': ['selectAll']}
+DELETE_KEY = {'key': 'Delete', 'code': 'Delete', 'windowsVirtualKeyCode': 46, 'nativeVirtualKeyCode': 46,
+              'commands': ['deleteForward']}
+
 @app.route('/type_input', methods=['POST'])
+@validate(text=(str, None), special_key=(str, None), debugging_port=((int, str), 9222),
+          delay=((int, float), 0),  # Optional pause after clearing the field
+          key_interval=((int, float), 0),  # Optional delay between keystrokes, 0 inserts the text in one go
+          clear_first=(bool, True))
 @handle_alerts
-def type_input(driver):
-    data = request.json
-    input_text = data.get('text')
-    special_key = data.get('special_key')
-    delay = data.get('delay', 0.1)  # Add configurable delay between keystrokes
-    clear_first = data.get('clear_first', True)  # New parameter, defaults to True
-
-    if not input_text and not special_key:
+def type_input(driver, text, special_key, debugging_port, delay, key_interval, clear_first):
+    # An empty text is allowed, e.g. to just clear the field
+    if text is None and not special_key:
         return jsonify({"error": "Either input text or special key must be provided"}), 400
 
     try:
@@ -986,13 +1195,13 @@ def type_input(driver):
 
         # Clear the input field first if requested
         if clear_first:
-            # Select all text (Ctrl+A) and delete it
-            if platform.system() == 'Darwin':  # macOS
-                pyautogui.hotkey('command', 'a')
-            else:  # Windows/Linux
-                pyautogui.hotkey('ctrl', 'a')
-            pyautogui.press('delete')
-            time.sleep(delay)  # Wait a bit after clearing
+            # Select all text and delete it; each CDP call returns once the page has handled
+            # the key, so the clear is done before any text is typed
+            for key in (SELECT_ALL_KEY, DELETE_KEY):
+                driver.execute_cdp_cmd('Input.dispatchKeyEvent', {'type': 'rawKeyDown', **key})
+                driver.execute_cdp_cmd('Input.dispatchKeyEvent', {'type': 'keyUp', **key})
+            if delay:
+                time.sleep(delay)  # Wait a bit after clearing
 
         if special_key:
             # Map special keys to PyAutoGUI keys
@@ -1030,13 +1239,20 @@ def type_input(driver):
                 if not key:
                     return jsonify({"error": f"Unsupported special key: {special_key}"}), 400
                 pyautogui.press(key)
+        elif key_interval:
+            # Type the text character by character for sites that need paced keystrokes; going
+            # through CDP keeps Unicode and sends it to the page rather than the focused OS window
+            for index, char in enumerate(text):
+                if index:
+                    time.sleep(key_interval)
+                driver.execute_cdp_cmd("Input.insertText", {"text": char})
         else:
-            # Type the regular text
-            pyautogui.write(input_text)
+            # Insert the whole text into the focused element with a single CDP call
+            driver.execute_cdp_cmd("Input.insertText", {"text": text})
 
         return jsonify({
             "message": "Keys sent successfully",
-            "text": input_text if input_text else special_key,
+            "text": text if text else special_key,
             "cleared_first": clear_first
         }), 200
 
@@ -1045,21 +1261,21 @@ def type_input(driver):
     
 
 @app.route('/inspect_element', methods=['POST'])
+@validate(x=((int, float), None), y=((int, float), None), debugging_port=((int, str), 9222))
 @handle_alerts
-def inspect_element(driver):
-    data = request.json
-    x = data.get('x')
-    y = data.get('y')
-    html_content = driver.execute_script(f"return document.elementFromPoint({x}, {y}).outerHTML;")
+def inspect_element(driver, x, y, debugging_port):
+    if x is None or y is None:
+        return jsonify({"error": "Both X and Y coordinates must be provided"}), 400
+
+    html_content = driver.execute_script("return document.elementFromPoint(arguments[0], arguments[1]).outerHTML;", x, y)
     return jsonify({"html_content": html_content}), 200
         
 @app.route('/scroll_page', methods=['POST'])
+@validate(scroll_type=(str, 'pixels'),  # 'pixels' or 'element'
+          value=((int, float, str), None),  # pixels to scroll or xpath of element
+          debugging_port=((int, str), 9222))
 @handle_alerts
-def scroll_page(driver):
-    data = request.json
-    scroll_type = data.get('scroll_type', 'pixels')  # 'pixels' or 'element'
-    value = data.get('value')  # pixels to scroll or xpath of element
-    debugging_port = data.get('debugging_port', 9222)
+def scroll_page(driver, scroll_type, value, debugging_port):
 
     if not value:
         return jsonify({"error": "Scroll value or element xpath must be provided"}), 400
@@ -1094,31 +1310,59 @@ def scroll_page(driver):
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
     
+# Fires the HTML5 drag and drop sequence from arguments[0] to arguments[1] with one shared DataTransfer;
+# arguments[2] and arguments[3] are the viewport points used for the event coordinates
+HTML5_DRAG_SCRIPT = compact_script("""
+    const [source, target, from, to] = arguments;
+    const dataTransfer = new DataTransfer();
+    const fire = (element, type, point) => element.dispatchEvent(new DragEvent(type, {
+        bubbles: true, cancelable: true, composed: true, dataTransfer: dataTransfer,
+        clientX: point.x, clientY: point.y
+    }));
+    fire(source, 'dragstart', from);
+    fire(target, 'dragenter', to);
+    fire(target, 'dragover', to);
+    fire(target, 'drop', to);
+    fire(source, 'dragend', to);
+""")
+
 @app.route('/drag_element', methods=['POST'])
+@validate(source_xpath=(str, None), target_xpath=(str, None), debugging_port=((int, str), 9222))
 @handle_alerts
-def drag_element(driver):
-    data = request.json
-    source_xpath = data.get('source_xpath')
-    target_xpath = data.get('target_xpath')
-    debugging_port = data.get('debugging_port', 9222)
+def drag_element(driver, source_xpath, target_xpath, debugging_port):
 
     if not source_xpath or not target_xpath:
         return jsonify({"error": "Both source_xpath and target_xpath must be provided"}), 400
 
     try:
-        # Wait for the source element to be present and clickable
+        # Wait for both elements to be present
         source_element = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, source_xpath))
+            EC.presence_of_element_located((By.XPATH, source_xpath))
         )
-        
-        # Wait for the target element to be present
         target_element = WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.XPATH, target_xpath))
         )
         
-        # Perform the drag and drop action
-        action_chains = ActionChains(driver)
-        action_chains.drag_and_drop(source_element, target_element).perform()
+        # Bring the source into view and read both element centers in one round trip
+        source_center, target_center, html5_draggable = driver.execute_script("""
+            arguments[0].scrollIntoView({block: 'center', inline: 'center'});
+            const centers = [arguments[0], arguments[1]].map(element => {
+                const rect = element.getBoundingClientRect();
+                return {x: rect.left + rect.width / 2, y: rect.top + rect.height / 2};
+            });
+            // Only an explicit draggable="true" opts in; images and links are draggable by default
+            return [centers[0], centers[1], arguments[0].getAttribute('draggable') === 'true'];
+        """, source_element, target_element)
+
+        if html5_draggable:
+            # Synthetic mouse events don't start a native HTML5 drag, so fire the drag events directly
+            driver.execute_script(HTML5_DRAG_SCRIPT, source_element, target_element, source_center, target_center)
+        else:
+            # Perform the drag and drop as raw CDP mouse events
+            dispatch_mouse_event(driver, 'mouseMoved', source_center)
+            dispatch_mouse_event(driver, 'mousePressed', source_center, clickCount=1)
+            dispatch_mouse_event(driver, 'mouseMoved', target_center, buttons=1)
+            dispatch_mouse_event(driver, 'mouseReleased', target_center, clickCount=1)
         
         # Log the action details
         print(f"Dragged element from {source_xpath} to {target_xpath}")
@@ -1141,136 +1385,117 @@ def drag_element(driver):
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
     
 
-def get_dom_content(driver):
-    try:
-        dom_content = driver.execute_script("return document.documentElement.outerHTML;")
-        return dom_content
-    except Exception as e:
-        print(f"Error getting DOM content: {e}")
-        return None
+def capture_screen_png():
+    """Take a full screenshot, cropped below the top of the screen, as PNG bytes"""
+    screenshot = pyautogui.screenshot()
 
-def generate_response(screenshot, dom_content):
-    try:
-        # Limit the size of dom_content if it's too large
-        max_dom_size = 1000000  # 1MB limit
-        if len(dom_content) > max_dom_size:
-            dom_content = dom_content[:max_dom_size] + "... (truncated)"
+    # Crop 50 pixels from top (to avoid partial window)
+    screen_width, screen_height = screenshot.size
+    cropped_screenshot = screenshot.crop((0, 50, screen_width, screen_height))
 
-        return json.dumps({
-            "screenshot": screenshot,
-            "dom_content": dom_content
-        })
-    except Exception as e:
-        print(f"Error generating response: {str(e)}")
-        return json.dumps({"error": "Failed to generate response"})
+    buffered = io.BytesIO()
+    cropped_screenshot.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+def screenshot_response(payload, png_bytes, multipart=False, key="screenshot", status=200):
+    """
+    Return payload with a screenshot attached.
+    By default the PNG is base64 encoded into payload[key]; with multipart=True the response is
+    multipart/mixed with the JSON payload as the first part and the raw PNG (if any) as the second.
+    """
+    if not multipart:
+        return Response(generate_response(payload, png_bytes, key), status=status, mimetype='application/json')
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Type: application/json\r\n\r\n'.encode(),
+        orjson.dumps(payload),
+        b'\r\n'
+    ]
+    if png_bytes is not None:
+        parts += [
+            f'--{boundary}\r\nContent-Type: image/png\r\nContent-Disposition: attachment; name="{key}"\r\n\r\n'.encode(),
+            png_bytes,
+            b'\r\n'
+        ]
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return Response(b''.join(parts), status=status, mimetype=f'multipart/mixed; boundary={boundary}')
+
+def generate_response(payload, png_bytes, key="screenshot", chunk_size=3 * 64 * 1024):
+    """
+    Stream payload as a JSON object with the PNG base64 encoded into payload[key].
+    The screenshot is encoded chunk by chunk so the whole base64 string is never held in memory.
+    """
+    if png_bytes is None:
+        yield orjson.dumps({key: None, **payload})
+        return
+
+    yield b'{"' + key.encode() + b'":"'
+    # Chunks are a multiple of 3 bytes so only the last one can carry base64 padding
+    png_view = memoryview(png_bytes)
+    for start in range(0, len(png_view), chunk_size):
+        yield base64.b64encode(png_view[start:start + chunk_size])
+
+    body = orjson.dumps(payload)
+    yield b'",' + body[1:] if len(body) > 2 else b'"}'
 
 @app.route('/look', methods=['POST'])
+@validate(debugging_port=((int, str), 9222),
+          format=(str, 'json'))  # 'multipart' returns the PNG as a raw binary part instead of base64 inside JSON
 @handle_alerts
-def look(driver):
-    data = request.json
-    debugging_port = data.get('debugging_port', 9222)
+def look(driver, debugging_port, format):
+    multipart = format == 'multipart'
     try:
         # Wait for the page to be fully loaded with a shorter timeout
         try:
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
+            wait_for_page(driver, 15)
         except TimeoutException:
             # If timeout occurs, capture what's available
-            window_rect = driver.get_window_rect()
-            
-            # Take full screenshot
-            screenshot = pyautogui.screenshot()
-            
-            # Get screen size
-            screen_width, screen_height = screenshot.size
-            
-            # Crop 30 pixels from top (to avoid partial window)
-            cropped_screenshot = screenshot.crop((0, 50, screen_width, screen_height))
-            
-            # Convert PIL image to base64
-            import io
-            import base64
-            buffered = io.BytesIO()
-            cropped_screenshot.save(buffered, format="PNG")
-            screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
-            
-            return jsonify({
+            return screenshot_response({
                 "error": "Timed out waiting for page to load",
-                "screenshot": screenshot_base64,
                 "current_url": driver.current_url,
                 "page_title": driver.title
-            }), 200
+            }, capture_screen_png(), multipart)
 
-        # Take full screenshot
-        screenshot = pyautogui.screenshot()
-        
-        # Get screen size
-        screen_width, screen_height = screenshot.size
-        
-        # Crop 30 pixels from top (to avoid partial window)
-        cropped_screenshot = screenshot.crop((0, 50, screen_width, screen_height))
-        
-        # Convert PIL image to base64
-        import io
-        import base64
-        buffered = io.BytesIO()
-        cropped_screenshot.save(buffered, format="PNG")
-        screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
+        # Take full screenshot in the background while the DOM is fetched
+        screenshot_future = CAPTURE_EXECUTOR.submit(capture_screen_png)
 
-        # Get DOM content
-        dom_content = driver.execute_script("return document.documentElement.outerHTML;")
+        # Get DOM content, URL and title in a single round trip; the DOM is truncated
+        # inside the page so oversized documents never cross the WebDriver wire
+        page_state = driver.execute_script("""
+            const html = document.documentElement.outerHTML;
+            return {
+                dom_content: html.length > arguments[0] ? html.slice(0, arguments[0]) + '... (truncated)' : html,
+                current_url: window.location.href,
+                page_title: document.title
+            };
+        """, MAX_DOM_SIZE)
+        screenshot_png = screenshot_future.result(timeout=15)
 
         # Return the response
         response_data = {
-            "screenshot": screenshot_base64,
-            "dom_content": dom_content,
-            "current_url": driver.current_url,
-            "page_title": driver.title
+            "dom_content": page_state["dom_content"],
+            "current_url": page_state["current_url"],
+            "page_title": page_state["page_title"]
         }
-        return jsonify(response_data)
+        return screenshot_response(response_data, screenshot_png, multipart)
     except Exception as e:
         # Capture any unexpected errors
         try:
-            # Take full screenshot
-            screenshot = pyautogui.screenshot()
-            
-            # Get screen size
-            screen_width, screen_height = screenshot.size
-            
-            # Crop 30 pixels from top
-            cropped_screenshot = screenshot.crop((0, 50, screen_width, screen_height))
-            
-            # Convert to base64
-            buffered = io.BytesIO()
-            cropped_screenshot.save(buffered, format="PNG")
-            error_screenshot_base64 = base64.b64encode(buffered.getvalue()).decode()
+            error_screenshot_png = capture_screen_png()
         except:
-            error_screenshot_base64 = None
+            error_screenshot_png = None
 
-        return jsonify({
+        return screenshot_response({
             "error": f"Unexpected error: {str(e)}",
-            "error_screenshot": error_screenshot_base64,
             "current_url": driver.current_url,
             "page_title": driver.title
-        }), 200
+        }, error_screenshot_png, multipart, key="error_screenshot")
     
-@app.route('/deep-look', methods=['POST'])
-@handle_alerts
-def deep_look(driver):
-    data = request.json
-    debugging_port = data.get('debugging_port', 9222)
-
-    try:
-        # Wait for the page to be fully loaded
-        try:
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-        except TimeoutException:
-            return jsonify({"error": "Timed out waiting for page to load"}), 504
-        
-        color_change="""// Function to generate a distinct light color based on index
+# Colours every visible div so the screenshot shows the page layout.
+# Wrapped in an IIFE so it can run repeatedly in the same page as a compiled script.
+DEEP_LOOK_COLOR_SCRIPT = """(() => {
+// Function to generate a distinct light color based on index
 function getDistinctLightColor(index) {
     const hueStep = 360 / 20; // Divide the color wheel into 20 parts
     const hue = index * hueStep % 360;
@@ -1279,33 +1504,47 @@ function getDistinctLightColor(index) {
     return `hsl(${hue}, ${saturation}%, ${lightness}%)`;
 }
 
-// Function to check if an element is visible
+// Function to check if an element is visible; checkVisibility() answers natively without
+// a computed style read, the fallback is for Chrome versions before 105
 function isVisible(element) {
+    if (element.checkVisibility) return element.checkVisibility({checkVisibilityCSS: true, visibilityProperty: true});
     if (element.offsetParent === null && element.tagName !== 'BODY') return false;
     const style = window.getComputedStyle(element);
     return style.display !== 'none' && style.visibility !== 'hidden';
 }
 
-// Function to apply color to a div element and set all text within it to black
+// CSS rule colouring the div tagged with the given index
+function colorRule(index) {
+    const color = getDistinctLightColor(index);
+    const outline = color.replace('hsl', 'hsla').replace(')', ', 0.7)');
+    return `[data-deep-look="${index}"] { background-color: ${color} !important; color: black !important; outline: 2px solid ${outline} !important; }`;
+}
+
+// All colours live in one constructed stylesheet (not subject to the page's style CSP), so the
+// browser restyles once instead of after every inline style write; text inside tagged divs is black
+const sheet = new CSSStyleSheet();
+window._deepLookSheet = sheet;
+
+// Function to tag a visible div and add its colour rule
 function applyColorToDiv(div, index) {
     if (isVisible(div)) {
-        const color = getDistinctLightColor(index);
-        div.style.backgroundColor = color;
-        div.style.color = 'black';
-        div.style.outline = '2px solid ' + color.replace('hsl', 'hsla').replace(')', ', 0.7)');
-        
-        // Set all text elements within the div to black
-        div.querySelectorAll('*').forEach(element => {
-            if (window.getComputedStyle(element).color !== 'rgb(0, 0, 0)') {
-                element.style.setProperty('color', 'black', 'important');
-            }
-        });
+        div.setAttribute('data-deep-look', index);
+        sheet.insertRule(colorRule(index), sheet.cssRules.length);
     }
 }
 
-// Select all div elements, filter visible ones, and apply distinct colors
+// Select all div elements and filter visible ones before tagging any of them,
+// so the page's layout is computed once
 const visibleDivs = Array.from(document.querySelectorAll('div')).filter(isVisible);
-visibleDivs.forEach(applyColorToDiv);
+
+// Tag them and apply all distinct colors at once
+const rules = ['[data-deep-look] * { color: black !important; }'];
+visibleDivs.forEach((div, index) => {
+    div.setAttribute('data-deep-look', index);
+    rules.push(colorRule(index));
+});
+sheet.replaceSync(rules.join('\\n'));
+document.adoptedStyleSheets = [...document.adoptedStyleSheets, sheet];
 
 // Optional: If you want newly added divs to also get distinct colors
 let divIndex = visibleDivs.length;
@@ -1319,52 +1558,110 @@ const observer = new MutationObserver(mutations => {
     });
 });
 observer.observe(document.body, { childList: true, subtree: true });
-"""
-        driver.execute_script(color_change)
-        # Allow some time for dynamic content to load
-        time.sleep(0.5)
-        
-        # Take a screenshot
-        screenshot = driver.get_screenshot_as_base64()
-
-        time.sleep(0.5)
-
-        reverse_script = """// Function to reverse the color effects
-function reverseColorEffects() {
-    // Select all elements
-    document.querySelectorAll('*').forEach(element => {
-        // Check if the element has inline background-color style
-        if (element.style.backgroundColor) {
-            // Remove the background color
-            element.style.removeProperty('background-color');
-            
-            // Remove the outline
-            element.style.removeProperty('outline');
-        }
 
-        // Remove the text color (assuming it was set to black)
-        if (element.style.color === 'black' || element.style.color === 'rgb(0, 0, 0)') {
-            element.style.removeProperty('color');
-        }
-    });
-}
+// Keep a handle so the reverse script can stop the observer
+window._deepLookObserver = observer;
 
-// Run the reverse function
-reverseColorEffects();
+// Resolve once the colours have been painted (two frames), or after 500ms if frames are throttled
+return new Promise(resolve => {
+    requestAnimationFrame(() => requestAnimationFrame(resolve));
+    setTimeout(resolve, 500);
+});
+})();
+"""
 
-// Stop the MutationObserver if it exists
-if (window.observer && window.observer.disconnect) {
-    window.observer.disconnect();
+DEEP_LOOK_REVERSE_SCRIPT = """(() => {
+// Stop the MutationObserver first so it doesn't react to the cleanup
+if (window._deepLookObserver) {
+    window._deepLookObserver.disconnect();
+    delete window._deepLookObserver;
 }
 
-// Remove any global variables or functions created by the original script
-if (window.getDistinctLightColor) delete window.getDistinctLightColor;
-if (window.isVisible) delete window.isVisible;
-if (window.applyColorToDiv) delete window.applyColorToDiv;
+// Drop the colour stylesheet and the tags it matched
+if (window._deepLookSheet) {
+    document.adoptedStyleSheets = document.adoptedStyleSheets.filter(sheet => sheet !== window._deepLookSheet);
+    delete window._deepLookSheet;
+}
+document.querySelectorAll('[data-deep-look]').forEach(element => element.removeAttribute('data-deep-look'));
+})();
 """
 
-        driver.execute_script(reverse_script)
+def run_cached_script(driver, name, source, await_promise=False):
+    """
+    Run a script through CDP, compiling it only once per page.
+    The scriptId is cached on the driver; compiled scripts don't survive navigation,
+    so a failed run recompiles and retries once. A script that throws raises JavascriptException.
+    With await_promise=True the call blocks until the promise the script returns settles.
+    """
+    if not hasattr(driver, 'compiled_scripts'):
+        driver.compiled_scripts = {}
+    script_ids = driver.compiled_scripts
+    for attempt in range(2):
+        if name not in script_ids:
+            script_ids[name] = driver.execute_cdp_cmd('Runtime.compileScript', {
+                'expression': source,
+                'sourceURL': name,
+                'persistScript': True
+            })['scriptId']
+        try:
+            result = driver.execute_cdp_cmd('Runtime.runScript', {
+                'scriptId': script_ids[name],
+                'awaitPromise': await_promise
+            })
+            break
+        except WebDriverException:
+            script_ids.pop(name, None)
+            if attempt == 1:
+                raise
+
+    # A script that throws (or whose promise rejects) is reported in the result, not as a CDP error
+    exception_details = result.get('exceptionDetails')
+    if exception_details:
+        exception = exception_details.get('exception', {})
+        message = exception.get('description') or exception_details.get('text', 'Script failed')
+        raise JavascriptException(f"{name}: {message}")
+    return result
+
+def capture_viewport_base64(driver):
+    """
+    Screenshot the current tab's viewport as base64 PNG straight from CDP.
+    optimizeForSpeed makes Chrome use its fast PNG encoder, trading a little size for encode time.
+    """
+    return driver.execute_cdp_cmd('Page.captureScreenshot', {
+        'format': 'png',
+        'fromSurface': True,
+        'captureBeyondViewport': False,
+        'optimizeForSpeed': True
+    })['data']
+
+@app.route('/deep-look', methods=['POST'])
+@validate(debugging_port=((int, str), 9222),
+          format=(str, 'json'))  # 'multipart' returns the PNG as a raw binary part instead of base64 inside JSON
+@handle_alerts
+def deep_look(driver, debugging_port, format):
+    multipart = format == 'multipart'
+
+    try:
+        # Wait for the page to be fully loaded
+        try:
+            wait_for_page(driver, 30)
+        except TimeoutException:
+            return jsonify({"error": "Timed out waiting for page to load"}), 504
         
+        # Returns once the colours have been painted
+        run_cached_script(driver, 'deep_look_color.js', DEEP_LOOK_COLOR_SCRIPT, await_promise=True)
+        
+        # Take a screenshot
+        screenshot = capture_viewport_base64(driver)
+
+        run_cached_script(driver, 'deep_look_reverse.js', DEEP_LOOK_REVERSE_SCRIPT)
+
+        if multipart:
+            # The driver already hands us base64, so only decode it for the binary part
+            return screenshot_response({
+                "message": "Screenshot captured successfully"
+            }, base64.b64decode(screenshot), multipart=True)
+
         return jsonify({
             "screenshot": screenshot,
             "message": "Screenshot captured successfully"
@@ -1373,15 +1670,18 @@ if (window.applyColorToDiv) delete window.applyColorToDiv;
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
     
+# Key identity shared by the Enter keyDown and keyUp events
+ENTER_KEY = {'key': 'Enter', 'code': 'Enter', 'windowsVirtualKeyCode': 13, 'nativeVirtualKeyCode': 13}
+
 @app.route('/press_enter', methods=['POST'])
+@validate(debugging_port=((int, str), 9222))
 @handle_alerts
-def press_enter(driver):
-    data = request.json
-    debugging_port = data.get('debugging_port', 9222)
-
+def press_enter(driver, debugging_port):
     try:
-        # Use ActionChains to send Enter key - most reliable cross-browser method
-        ActionChains(driver).send_keys(Keys.RETURN).perform()
+        # Send Enter straight to the focused element as CDP key events; the '\r' text
+        # makes it submit forms and insert newlines like a real key press
+        driver.execute_cdp_cmd('Input.dispatchKeyEvent', {'type': 'keyDown', 'text': '\r', **ENTER_KEY})
+        driver.execute_cdp_cmd('Input.dispatchKeyEvent', {'type': 'keyUp', **ENTER_KEY})
         
         return jsonify({
             "message": "Enter key pressed successfully"
@@ -1393,19 +1693,16 @@ def press_enter(driver):
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
     
 @app.route('/go_back', methods=['POST'])
+@validate(debugging_port=((int, str), 9222))
 @handle_alerts
-def go_back(driver):
-    data = request.json
-    debugging_port = data.get('debugging_port', 9222)
+def go_back(driver, debugging_port):
 
     try:
         # Go back to the previous page
         driver.back()
         
         # Wait for the page to load
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
+        wait_for_page(driver, 10)
         
         current_url = driver.current_url
         page_title = driver.title
@@ -1424,99 +1721,15 @@ def go_back(driver):
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
     
 @app.route('/get_console_log', methods=['GET'])
+@validate(debugging_port=((int, str), 9222))
 @handle_alerts
-def get_console_log(driver):
-    debugging_port = request.args.get('debugging_port', 9222)
+def get_console_log(driver, debugging_port):
 
     try:
-        # First, check if our logging is initialized
-        is_initialized = driver.execute_script("""
-            return window._consoleLogs !== undefined;
-        """)
-        
-        print(f"Logging initialized: {is_initialized}")
-
-        # If not initialized, inject our logging script
-        if not is_initialized:
-            print("Initializing console logging...")
-            # Inject the logging script in parts to ensure it's all executed
-            driver.execute_script("""
-                // Create the storage array
-                window._consoleLogs = [];
-                
-                // Create a function to format messages
-                window._formatLogMessage = function(arg) {
-                    if (arg === null) return 'null';
-                    if (arg === undefined) return 'undefined';
-                    if (typeof arg === 'object') {
-                        try {
-                            return JSON.stringify(arg);
-                        } catch (e) {
-                            return String(arg);
-                        }
-                    }
-                    return String(arg);
-                };
-            """)
-
-            # Override console methods
-            driver.execute_script("""
-                ['log', 'info', 'warn', 'error', 'debug'].forEach(function(method) {
-                    const originalFn = console[method];
-                    console[method] = function(...args) {
-                        const message = Array.from(args).map(window._formatLogMessage).join(' ');
-                        window._consoleLogs.push({
-                            level: method,
-                            message: message,
-                            timestamp: new Date().toISOString(),
-                            url: window.location.href
-                        });
-                        originalFn.apply(console, args);
-                    };
-                });
-            """)
-
-            # Add error listeners
-            driver.execute_script("""
-                window.addEventListener('error', function(event) {
-                    window._consoleLogs.push({
-                        level: 'error',
-                        message: event.message,
-                        timestamp: new Date().toISOString(),
-                        url: event.filename,
-                        line: event.lineno,
-                        column: event.colno
-                    });
-                });
-
-                window.addEventListener('unhandledrejection', function(event) {
-                    window._consoleLogs.push({
-                        level: 'error',
-                        message: 'Unhandled Promise Rejection: ' + event.reason,
-                        timestamp: new Date().toISOString(),
-                        url: window.location.href
-                    });
-                });
-            """)
-
-            print("Console logging initialization complete")
-
-        # Get the logs
-        logs = driver.execute_script("return window._consoleLogs;")
+        # Set up logging if this page predates it, and read the logs, in a single round trip
+        logs = driver.execute_script(CONSOLE_LOGGING_SCRIPT + "\nreturn window._consoleLogs;")
         print(f"Retrieved {len(logs) if logs else 0} logs")
-        
-        # Verify logs exist
-        if not logs:
-            print("No logs found, checking console directly...")
-            # Try to directly log and retrieve
-            driver.execute_script("""
-                if (!window._consoleLogs) {
-                    console.error('_consoleLogs is undefined!');
-                } else {
-                    console.log('Current log count:', window._consoleLogs.length);
-                }
-            """)
-        
+
         return jsonify({
             "message": "Console logs retrieved successfully",
             "logs": logs
@@ -1529,8 +1742,9 @@ def get_console_log(driver):
 
 # Add a method to clear logs if needed
 @app.route('/clear_console_log', methods=['POST'])
+@validate(debugging_port=((int, str), 9222))
 @handle_alerts
-def clear_console_log(driver):
+def clear_console_log(driver, debugging_port):
     try:
         driver.execute_script("window._consoleLogs = [];")
         return jsonify({
@@ -1543,9 +1757,34 @@ def clear_console_log(driver):
 def folder_tree():
     folder_path = request.args.get('folder_path')
 
-    # cd into /home/fume/Documents and run find {folder_path} -type f -exec ls -l {} \; | grep -v ^total
-    command = f"cd /home/fume/Documents && find {folder_path} -mindepth 1 -maxdepth 3"
-    output = subprocess.check_output(command, shell=True).decode('utf-8')
+    # Only allow relative paths that, with symlinks resolved, stay inside the documents folder
+    documents_dir = os.path.realpath(DOCUMENTS_DIR)
+    if (not folder_path or os.path.isabs(folder_path) or os.path.commonpath(
+            [documents_dir, os.path.realpath(os.path.join(documents_dir, folder_path))]) != documents_dir):
+        return jsonify({"error": "folder_path must be a relative path inside the documents folder"}), 400
+
+    # List entries up to three levels deep, parents before children, in the same format as
+    # `find folder_path -mindepth 1 -maxdepth 3` run from the documents folder
+    lines = []
+    def walk(relative_dir, depth):
+        with os.scandir(os.path.join(DOCUMENTS_DIR, relative_dir)) as entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                lines.append(relative_path)
+                # Like find, don't descend into symlinked directories
+                if depth < 3 and entry.is_dir(follow_symlinks=False):
+                    try:
+                        walk(relative_path, depth + 1)
+                    except PermissionError:
+                        continue
+
+    try:
+        walk(folder_path, 1)
+    except NotADirectoryError:
+        pass
+    except OSError as e:
+        return jsonify({"error": f"Failed to list folder: {e.strerror}: '{folder_path}'"}), 500
+    output = ''.join(line + '\n' for line in lines)
     
     return jsonify({
         "message": "Folder tree retrieved successfully",
@@ -1554,16 +1793,15 @@ def folder_tree():
     })
 
 @app.route('/find-repo', methods=['POST'])
-def find_repo():
-    data = request.json
-    remote_url = data.get('remote_url')
+@validate(remote_url=(str, None))
+def find_repo(remote_url):
     
     if not remote_url:
         return jsonify({"error": "Remote URL not provided"}), 400
     
     try:
         # Start from /home/fume/Documents
-        base_path = '/home/fume/Documents'
+        base_path = DOCUMENTS_DIR
         
         # Function to get immediate subdirectories
         def get_subdirs(path):
@@ -1646,7 +1884,7 @@ def can_connect_to_driver(debugging_port=9222):
     """
     try:
         # First check if the debugging port is responding
-        response = requests.get(f'http://localhost:{debugging_port}/json/version', timeout=2)
+        response = CHROME_SESSION.get(f'http://localhost:{debugging_port}/json/version', timeout=2)
         
         if response.status_code != 200:
             return {
@@ -0,0 +1,9 @@
+# Serve the API with: gunicorn -c gunicorn.conf.py api:app
+# gevent workers let the many blocking Selenium/HTTP waits yield to other requests.
+bind = '0.0.0.0:5553'
+workers = 1
+worker_class = 'gevent'
+worker_connections = 100
+
+# go_to_url allows page loads of up to 300 seconds
+timeout = 310
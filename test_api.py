@@ -0,0 +1,25 @@
+import unittest
+
+try:
+    import api
+except Exception as e:  # pyautogui needs a display, Chrome tooling may be missing
+    raise unittest.SkipTest(f"api could not be imported: {e}")
+
+
+class ExtractBodyContentTest(unittest.TestCase):
+    def test_body_literal_in_head_script(self):
+        dom = '<head><script>var s="<body>";</script></head><body><p>a</p></body>'
+        self.assertEqual(api.extract_body_content(dom), '<body>\n<p>a</p>\n</body>')
+
+    def test_body_only_inside_comment(self):
+        dom = '<!-- <body>x</body> --><div>y</div>'
+        self.assertEqual(api.extract_body_content(dom), "No body tag found in the DOM string.")
+
+    def test_xml_declaration_with_encoding(self):
+        # Two bodies keep the regex fast path out, so the lxml parse is exercised
+        dom = '<?xml version="1.0" encoding="ISO-8859-1"?><html><body><p>caf\u00e9</p><!-- <body> --></body></html>'
+        self.assertEqual(api.extract_body_content(dom), '<body>\n<p>caf\u00e9</p><!-- <body> -->\n</body>')
+
+
+if __name__ == '__main__':
+    unittest.main()